@@ -2,7 +2,7 @@
 
 """
 HC-SR04 Intruder Alert (Raspberry Pi 5) — safe 3.3V mode
-- GPIO backend: prefers lgpio (Pi 5 friendly), auto-fallback to pigpio, then default
+- GPIO: raw lgpio HC-SR04 driver (Pi 5 friendly, kernel-timestamped echo edges)
 - Discord webhook on trigger (one alert per cooldown window)
 - Optional photo using rpicam-still (Bookworm), fallback to libcamera-still → fswebcam
 - Clear logs for: TRIGGER→send, TRIGGER→cooldown (not sending), and CLEAR (out of range)
@@ -11,18 +11,50 @@ HC-SR04 Intruder Alert (Raspberry Pi 5) — safe 3.3V mode
 from __future__ import annotations  # Forward annotation support on older 3.x
 
 # --- Standard library imports (OS/process/time/logging/utilities) ---
+import io               # In-memory JPEG buffers for the webhook upload
 import os               # Read environment variables (WEBHOOK_URL, etc.)
+import re               # One-time webhook URL sanity check
 import time             # Sleep intervals and timestamps for cooldown
 import sys              # Access stdout for logging stream handler
+import signal           # Park the main thread while callbacks do the work
+import atexit           # Close the HTTP session cleanly on exit
 import logging          # Uniform console logs the examiner can read
-import subprocess       # Call CLI camera tools (rpicam-still, fswebcam)
-import shutil           # Check presence of CLI tools with shutil.which
-from datetime import datetime  # Timestamp in Discord message
+from logging.handlers import MemoryHandler  # Batch routine logs, flush on alerts
+import threading        # Event to hand echo edges from lgpio's thread to ours
+from collections import deque  # Recent-alert history for duplicate suppression
+from concurrent.futures import ThreadPoolExecutor  # Background capture+send jobs
+from dataclasses import dataclass  # Typed, frozen runtime configuration
 from typing import Optional     # Type hint for optional image path
 
 # --- Third-party libs installed via apt/pip ---
-from gpiozero import Device, DistanceSensor  # High-level GPIO abstraction
-import requests                              # HTTP client for Discord webhook
+# requests/httpx and the CLI-tool helpers (subprocess, shutil, tempfile) are
+# imported lazily on the first alert: on a Pi SD-card cold boot they cost tens
+# of ms each, and none of them is needed before the first trigger.
+import lgpio                                 # Direct kernel GPIO access (Pi 5)
+import numpy as np                           # C-speed median filter over the sample ring
+
+try:
+    from picamera2 import Picamera2  # In-process camera (no rpicam-still spawn per alert)
+except ImportError:  # Not fatal — we fall back to the CLI tools below
+    Picamera2 = None
+
+try:
+    import simplejpeg    # Fast JPEG encoding straight from the capture array
+except ImportError:  # Optional; picamera2 can encode on its own
+    simplejpeg = None
+
+# JSON encoder for the webhook payload: orjson returns bytes directly (~5×
+# faster than stdlib and no str→utf-8 step inside requests); stdlib otherwise.
+try:
+    import orjson
+
+    def _json_bytes(obj: dict) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def _json_bytes(obj: dict) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
 # -------------------- CONFIG (edit here or use env) --------------------
 
@@ -30,139 +62,526 @@ TRIG_GPIO = 23  # BCM (physical pin 16) – HC-SR04 TRIG pin
 ECHO_GPIO = 24  # BCM (physical pin 18) – HC-SR04 ECHO pin
 
 POWERED_AT_3V3 = True                      # We wire VCC of HC-SR04 to 3.3V (safe ECHO to Pi)
-MAX_DISTANCE_M = 1.5 if POWERED_AT_3V3 else 3.5  # Conservative max distance depending on supply
 
-# Trigger threshold (cm). Can be overridden at runtime: INTRUDER_THRESHOLD_CM=60 python3 ...
-DISTANCE_THRESHOLD_CM = float(os.getenv("INTRUDER_THRESHOLD_CM", "35"))
-
-# Sensor read cadence (seconds). Can be overridden via INTRUDER_SAMPLE_S
-SAMPLE_INTERVAL = float(os.getenv("INTRUDER_SAMPLE_S", "0.25"))
-
-# Cooldown duration (seconds) between notifications. Overridable via INTRUDER_COOLDOWN
-COOLDOWN_SECONDS = float(os.getenv("INTRUDER_COOLDOWN", "30"))
-
-# Whether to capture and attach a photo. Runtime override: SEND_PHOTO=0 (false/no)
-SEND_PHOTO = os.getenv("SEND_PHOTO", "1").lower() not in ("0", "false", "no")
-
-# Where a captured image is written temporarily
-PHOTO_PATH = "/tmp/intruder.jpg"
-
-# Discord webhook URL. Prefer passing via env to avoid leaking secrets.
-WEBHOOK_URL = os.getenv("WEBHOOK_URL", "PUT_A_NEW_DISCORD_WEBHOOK_HERE")
+@dataclass(frozen=True)
+class Config:
+    """All runtime settings, read from the environment exactly once at startup."""
+    threshold_cm: float   # Trigger threshold (cm)
+    sample_s: float       # Sensor read cadence (seconds)
+    cooldown_s: float     # Cooldown duration (seconds) between notifications
+    send_photo: bool      # Whether to capture and attach a photo
+    webhook_url: str      # Discord webhook URL (prefer env to avoid leaking secrets)
+    max_distance_m: float # Conservative max range depending on supply voltage
+    state_path: str       # Where the last-send timestamp is persisted across restarts
+
+def load_config() -> Config:
+    """
+    Read every env override in one place and freeze the result.
+    Example: INTRUDER_THRESHOLD_CM=60 SEND_PHOTO=0 python3 intruder_alert.py
+    """
+    return Config(
+        threshold_cm=float(os.getenv("INTRUDER_THRESHOLD_CM", "35")),
+        sample_s=float(os.getenv("INTRUDER_SAMPLE_S", "0.25")),
+        cooldown_s=float(os.getenv("INTRUDER_COOLDOWN", "30")),
+        send_photo=os.getenv("SEND_PHOTO", "1").lower() not in ("0", "false", "no"),
+        webhook_url=os.getenv("WEBHOOK_URL", "PUT_A_NEW_DISCORD_WEBHOOK_HERE"),
+        max_distance_m=1.5 if POWERED_AT_3V3 else 3.5,
+        state_path=os.getenv("INTRUDER_STATE", "/run/intruder.last"),
+    )
+
+CFG = load_config()  # Single source of truth; no os.getenv anywhere else
 
 # ----------------------------------------------------------------------
 
 # -------------------- Logging --------------------
 
+# Custom level for TRIGGER/CLEAR lines: above WARNING so they flush the log
+# buffer the moment they happen, unlike routine INFO chatter.
+ALERT = logging.WARNING + 5
+logging.addLevelName(ALERT, "ALERT")
+
+# Each log line used to cost a lock + format + write() + flush() syscall at
+# 4 Hz. Routine INFO records now batch in memory and only hit stdout in groups
+# of 16 — or immediately when anything at WARNING/ALERT level arrives.
+_STREAM = logging.StreamHandler(sys.stdout)            # Print to console
+_STREAM.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+
 logging.basicConfig(                       # Configure global logging once
     level=logging.INFO,                    # INFO is readable in demos; DEBUG would be too chatty
-    format="%(asctime)s [%(levelname)s] %(message)s",  # Timestamp + level + message
-    handlers=[logging.StreamHandler(sys.stdout)],      # Print to console
+    handlers=[MemoryHandler(
+        capacity=16,                       # Flush after 16 buffered records...
+        flushLevel=logging.WARNING,        # ...or as soon as anything urgent lands
+        target=_STREAM,
+        flushOnClose=True,                 # Nothing is lost at logging.shutdown()
+    )],
 )
 
-# -------------------- GPIO backend selection --------------------
-# Prefer lgpio on Pi 5 (fast, kernel-backed). If unavailable, try pigpio. Otherwise fall back to default.
+# -------------------- Ultrasonic sensor driver --------------------
+# A small raw-lgpio HC-SR04 driver where the kernel timestamps the ECHO edges
+# for us (no Python work per edge). lgpio ships with Raspberry Pi OS Bookworm,
+# and going straight to it skips gpiozero's pin-factory layers (and their
+# import cost) entirely.
 
-def _select_backend() -> None:
-    try:
-        from gpiozero.pins.lgpio import LGPIOFactory  # Import inside try so we can fall back cleanly
-        Device.pin_factory = LGPIOFactory()           # Set lgpio as the active backend
-        logging.info("GPIO backend: lgpio")
-        return
-    except Exception as e:
-        logging.warning(f"lgpio unavailable ({e}); trying pigpio...")
+_GPIOCHIP = 4            # Pi 5 exposes the 40-pin header on gpiochip4
+_SOUND_M_PER_S = 343.0   # Speed of sound at ~20 °C, for echo → distance
+_MEDIAN_QUEUE = 5        # Ring buffer length for median filtering
+
+# Echo pulse width (ns) → distance (cm), folded into one constant so each
+# sample costs a single multiply instead of divide + convert chains.
+_NS_TO_CM = _SOUND_M_PER_S / 2.0 / 1e9 * 100.0
 
+def _boost_measure_priority() -> None:
+    """
+    Ask the kernel for SCHED_FIFO on the measurement thread so its wake-ups
+    aren't jittered by ordinary processes (echo pulses are only tens to
+    thousands of µs). Needs CAP_SYS_NICE/root; degrade to a nice boost, then
+    to nothing, without complaining loudly.
+    """
     try:
-        from gpiozero.pins.pigpio import PiGPIOFactory  # Second choice backend
-        Device.pin_factory = PiGPIOFactory()            # Requires pigpiod (daemon); OK if not present
-        logging.info("GPIO backend: pigpio")
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))  # This thread only
+        logging.info("Measurement thread: SCHED_FIFO (priority 20)")
         return
-    except Exception as e:
-        logging.warning(f"pigpio unavailable ({e}); using gpiozero default backend.")
+    except (PermissionError, OSError):
+        pass
+    try:
+        os.nice(-10)    # Process-wide, but better than nothing without root
+        logging.info("Measurement thread: SCHED_FIFO unavailable; nice -10 instead")
+    except OSError:
+        logging.info("Measurement thread: running at default priority")
 
-_select_backend()  # Decide the backend once at startup
+class HCSR04:
+    """
+    Minimal HC-SR04 driver on raw lgpio.
+    The kernel delivers ECHO edges with nanosecond timestamps via
+    gpio_claim_alert, so the pulse width is measured without polling and the
+    Python callback only stores two integers. Readings pass through a small
+    median filter to reject the sensor's occasional outlier spikes.
+    """
+
+    def __init__(self, trig: int, echo: int, max_distance_m: float) -> None:
+        self.max_distance = max_distance_m          # Max trustworthy range (m)
+        self._max_cm = max_distance_m * 100.0       # Precomputed: used on every sample
+        self._h = lgpio.gpiochip_open(_GPIOCHIP)    # Handle to the header gpiochip
+        self._trig = trig
+        lgpio.gpio_claim_output(self._h, trig, 0)   # TRIG idles low
+        lgpio.gpio_claim_alert(self._h, echo, lgpio.BOTH_EDGES)  # Kernel-side edge alerts
+        self._rise_ns = 0                           # Preallocated slots for the two edges
+        self._fall_ns = 0
+        self._echo_done = threading.Event()         # Set by the falling edge
+        self._cb = lgpio.callback(self._h, echo, lgpio.BOTH_EDGES, self._on_edge)
+        # Start the filter queue at max range ("nothing in sight")
+        self._samples = np.full(_MEDIAN_QUEUE, max_distance_m * 100.0, dtype=np.float32)
+        self._idx = 0
+        self._stop = threading.Event()              # Tells the watch thread to exit
+        self._watch: Optional[threading.Thread] = None
+        # No echo for a full round trip at max range means nothing is there;
+        # generous margin because the HC-SR04 can hold ECHO high for ~38 ms.
+        self._echo_timeout = max(0.06, 2.0 * max_distance_m / _SOUND_M_PER_S * 4.0)
+
+    def _on_edge(self, chip: int, gpio: int, level: int, tick_ns: int) -> None:
+        """Runs on lgpio's notification thread: just record the edge timestamps."""
+        if level == 1:
+            self._rise_ns = tick_ns                 # ECHO went high: ping left the sensor
+        elif level == 0:
+            self._fall_ns = tick_ns                 # ECHO dropped: echo came back
+            self._echo_done.set()
+
+    def read_cm(self) -> float:
+        """Fire one measurement and return the median-filtered distance in cm."""
+        self._echo_done.clear()
+        lgpio.gpio_write(self._h, self._trig, 1)    # 10 µs trigger pulse
+        time.sleep(10e-6)
+        lgpio.gpio_write(self._h, self._trig, 0)
+
+        if self._echo_done.wait(self._echo_timeout):
+            dist_cm = min((self._fall_ns - self._rise_ns) * _NS_TO_CM, self._max_cm)
+        else:
+            dist_cm = self._max_cm                  # Timed out → treat as out of range
+
+        self._samples[self._idx % _MEDIAN_QUEUE] = dist_cm
+        self._idx += 1
+        # Median via partial sort in C: robust to the HC-SR04's outlier spikes
+        # (e.g. 2.4 GHz interference) and ~1 µs for a 5-element float32 buffer
+        mid = _MEDIAN_QUEUE // 2
+        return float(np.partition(self._samples, mid)[mid])
+
+    def start_watching(self, threshold_cm: float, sample_s: float,
+                       on_in_range, on_clear) -> None:
+        """
+        Sample on a daemon thread and fire callbacks only on threshold
+        crossings: on_in_range(dist_cm) when something enters the zone,
+        on_clear() when it leaves. The HC-SR04 has to be pinged to measure, so
+        this polls internally — but the rest of the program is purely
+        event-driven.
+        """
+        self._watch = threading.Thread(
+            target=self._watch_loop,
+            args=(threshold_cm, sample_s, on_in_range, on_clear),
+            daemon=True,
+            name="hcsr04-watch",
+        )
+        self._watch.start()
+
+    def _watch_loop(self, threshold_cm: float, sample_s: float,
+                    on_in_range, on_clear) -> None:
+        _boost_measure_priority()       # Deterministic wake-ups for the echo timing
+        was_in_range = False
+        # Bind the per-iteration lookups to locals once: LOAD_FAST in the loop
+        # body instead of attribute/global resolution on every sample.
+        read_cm = self.read_cm
+        stopping = self._stop.is_set
+        wait = self._stop.wait
+        monotonic = time.monotonic
+        # Deadline scheduler: samples land on fixed monotonic epochs, so a slow
+        # callback doesn't push every later sample back (drift-free).
+        next_tick = monotonic()
+        while not stopping():
+            dist_cm = read_cm()
+            in_range = dist_cm <= threshold_cm
+            if in_range and not was_in_range:
+                on_in_range(dist_cm)        # Rising edge: something entered the zone
+            elif was_in_range and not in_range:
+                on_clear()                  # Falling edge: the zone is empty again
+            was_in_range = in_range
+
+            next_tick += sample_s
+            delay = next_tick - monotonic()
+            if delay > 0:
+                wait(delay)                 # Interruptible sleep until the deadline
+            else:
+                next_tick = monotonic()     # Fell behind: re-anchor, don't burst
+
+    def close(self) -> None:
+        """Stop the watch thread and release the callback and GPIO lines."""
+        self._stop.set()                    # Stop the watch thread first
+        if self._watch is not None:
+            self._watch.join(timeout=1.0)
+        try:
+            self._cb.cancel()
+        except Exception:
+            pass
+        lgpio.gpiochip_close(self._h)
+
+def make_sensor(cfg: Config) -> HCSR04:
+    """Build the lgpio-backed driver on the configured pins."""
+    sensor = HCSR04(TRIG_GPIO, ECHO_GPIO, cfg.max_distance_m)
+    logging.info("Sensor driver: raw lgpio HCSR04 (kernel edge alerts)")
+    return sensor
 
 # -------------------- Camera helpers --------------------
 
-def _run_quiet(cmd: list[str]) -> bool:
+# subprocess.DEVNULL makes every run() open and close /dev/null twice; open it
+# once here and hand the same fd to each capture instead (alert hot path).
+_DEVNULL = os.open(os.devnull, os.O_RDWR)
+atexit.register(os.close, _DEVNULL)
+
+def _run_quiet(cmd: tuple[str, ...]) -> bool:
     """Run a CLI command and return True on success, suppressing stdout/stderr for clean logs."""
+    import subprocess  # Deferred: only needed once a capture actually happens
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        subprocess.run(cmd, check=True, stdout=_DEVNULL, stderr=_DEVNULL, close_fds=True)
         return True
     except Exception:
         return False
 
-def capture_image(path: str) -> bool:
+def _probe_camera_cmd() -> Optional[tuple[str, ...]]:
     """
-    Take a snapshot to 'path'.
-    Preference order:
+    Walk PATH exactly once (on the first capture) and bake the capture argv
+    (sans output path). Preference order:
     1) rpicam-still (Bookworm default)
     2) libcamera-still (legacy name)
     3) fswebcam (USB webcam fallback)
-    Return True iff the output file exists afterwards.
     """
-    try:
-        if os.path.exists(path):   # Remove stale file so existence check is meaningful
-            os.remove(path)
-    except Exception:
-        pass
-
-    # Primary: rpicam-still on Bookworm (Camera Module 3 friendly)
+    import shutil      # Deferred with the rest of the CLI-capture machinery
     if shutil.which("rpicam-still"):
-        if _run_quiet([
+        # Primary: rpicam-still on Bookworm (Camera Module 3 friendly)
+        return (
             "rpicam-still", "-n",           # -n: no preview (headless)
             "--zsl",                        # Zero Shutter Lag for better quality
             "-t", "500",                    # Short warm-up (ms)
             "--immediate",                  # Capture now
             "--width", "1280", "--height", "720",  # Reasonable resolution for webhook
-            "-o", path                      # Output file path
-        ]):
-            return os.path.isfile(path)
-
-    # Legacy: libcamera-still may still be present on some systems
+            "-o",                           # Output path appended per capture
+        )
     if shutil.which("libcamera-still"):
-        if _run_quiet([
+        # Legacy: libcamera-still may still be present on some systems
+        return (
             "libcamera-still", "-n",
             "-t", "500", "--immediate",
             "--width", "1280", "--height", "720",
-            "-o", path
-        ]):
-            return os.path.isfile(path)
-
-    # USB fallback: fswebcam if a USB camera is attached
+            "-o",
+        )
     if shutil.which("fswebcam"):
-        if _run_quiet(["fswebcam", "-r", "1280x720", "--no-banner", path]):
-            return os.path.isfile(path)
+        # USB fallback: fswebcam if a USB camera is attached
+        return ("fswebcam", "-r", "1280x720", "--no-banner")
+    return None  # No camera tool installed
 
-    return False  # None of the commands succeeded
+_CAM_CMD: Optional[tuple[str, ...]] = None  # Probed lazily; None until first capture
+_CAM_PROBED = False
+
+def _get_cam_cmd() -> Optional[tuple[str, ...]]:
+    """Return the cached capture argv, probing PATH only on the first call."""
+    global _CAM_CMD, _CAM_PROBED
+    if not _CAM_PROBED:
+        _CAM_CMD = _probe_camera_cmd()
+        _CAM_PROBED = True
+    return _CAM_CMD
+
+# Snapshots live in tmpfs (RAM) when available: zero disk I/O, nothing stale
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+def capture_image() -> Optional[bytes]:
+    """
+    Take a snapshot via the CLI tool and return the JPEG bytes, or None if no
+    camera tool is available or the capture failed. The CLI needs a file to
+    write to, so we bounce through a tmpfs scratch file (RAM, not disk) and
+    unlink it immediately — nothing past this function touches the filesystem.
+    """
+    cam_cmd = _get_cam_cmd()
+    if cam_cmd is None:
+        return None
+
+    import tempfile    # Deferred with the rest of the CLI-capture machinery
+    fd, path = tempfile.mkstemp(suffix=".jpg", dir=_SHM_DIR)  # Unique file, no stale state
+    os.close(fd)
+    try:
+        if _run_quiet(cam_cmd + (path,)):
+            with open(path, "rb") as f:
+                jpeg = f.read()
+            if jpeg:               # Guard against a tool "succeeding" with an empty file
+                return jpeg
+        return None
+    finally:
+        try:
+            os.unlink(path)        # Scratch file never outlives the capture
+        except OSError:
+            pass
+
+class Camera:
+    """
+    In-process picamera2 camera kept configured and started for the whole run.
+    rpicam-still re-initializes libcamera, opens the sensor and builds the
+    pipeline on every spawn (~hundreds of ms of setup per shot); doing that
+    once at startup means a capture is just grab-frame + JPEG-encode.
+    """
+
+    def __init__(self) -> None:
+        self._cam = Picamera2()
+        self._cam.configure(self._cam.create_still_configuration(
+            main={"size": (1280, 720), "format": "RGB888"},  # Webhook-friendly resolution
+        ))
+        self._cam.start()   # Pipeline stays warm from here on
+
+    def capture(self) -> Optional[bytes]:
+        """Grab one frame and return it as JPEG bytes (None on failure)."""
+        try:
+            if simplejpeg is not None:
+                # picamera2's "RGB888" delivers B,G,R memory order (libcamera
+                # fourcc naming), so tell the encoder it's BGR or the photo
+                # uploads with red and blue swapped.
+                arr = self._cam.capture_array("main")            # Raw frame, BGR order
+                return simplejpeg.encode_jpeg(arr, quality=80, colorspace="BGR")
+            buf = io.BytesIO()
+            self._cam.capture_file(buf, format="jpeg")           # picamera2's own encoder
+            return buf.getvalue()
+        except Exception as e:   # libcamera timeouts and friends surface here
+            logging.warning(f"picamera2 capture failed: {e}")
+            return None
+
+    def close(self) -> None:
+        """Stop the pipeline and release the camera."""
+        try:
+            self._cam.stop()
+            self._cam.close()
+        except Exception:
+            pass
+
+def _make_camera() -> Optional[Camera]:
+    """Warm up picamera2 if present and photos are wanted; else CLI fallback applies."""
+    if Picamera2 is None or not CFG.send_photo:
+        return None
+    try:
+        cam = Camera()
+        logging.info("Camera: picamera2 pipeline warmed up in-process")
+        atexit.register(cam.close)   # Release the sensor on shutdown
+        return cam
+    except Exception as e:
+        logging.warning(f"picamera2 init failed ({e}); falling back to CLI capture.")
+        return None
+
+_CAMERA = _make_camera()  # One warm pipeline for the life of the daemon (or None)
 
 # -------------------- Discord --------------------
 
-def send_discord(distance_cm: float, image_path: Optional[str] = None) -> None:
+# Split timeout: fail fast on connect (5s), allow slower uploads on read (15s)
+_HTTP_TIMEOUT = (5, 15)
+
+# Fixed header for the pre-encoded JSON body (skips requests' json= machinery)
+_JSON_HDR = {"Content-Type": "application/json"}
+
+# Transports, built lazily on the first alert (importing requests/httpx at
+# module load delays the first sensor sample by tens of ms on an SD card).
+# Only the single alert-worker thread calls _init_http, so no lock is needed.
+_SESSION = None   # Pooled requests session (always built; carries the retries)
+_CLIENT = None    # Preferred httpx HTTP/2 client, when the extra is installed
+
+def _init_http() -> None:
+    """Build the HTTP transports on first use and cache them in module globals."""
+    global _SESSION, _CLIENT
+    if _SESSION is not None:
+        return
+
+    # Discord is always the same HTTPS endpoint, so keep one persistent
+    # session: keep-alive reuses the TCP+TLS connection across alerts instead
+    # of paying a fresh handshake every time. Retries cover 5xx/rate limiting.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry
+
+    _SESSION = requests.Session()
+    _SESSION.mount("https://", HTTPAdapter(
+        pool_connections=1,   # One backend (discord.com) → one pool is enough
+        pool_maxsize=2,       # Small headroom if an alert overlaps a retry
+        max_retries=Retry(
+            total=3,                                      # Three retries max per POST
+            backoff_factor=0.5,                           # 0.5s, 1s, 2s between attempts
+            status_forcelist=(429, 500, 502, 503, 504),   # Retry-worthy statuses
+            respect_retry_after_header=True,              # Honour Discord's Retry-After on 429
+            allowed_methods=["POST"],                     # POST isn't retried by default
+        ),
+    ))
+    atexit.register(_SESSION.close)  # Release the pooled connection on shutdown
+
+    # Preferred transport: an HTTP/2 httpx client — one multiplexed TLS
+    # connection plus HPACK header compression shaves a couple hundred bytes
+    # per POST. The requests session above stays as the fallback.
+    try:
+        import httpx
+        _CLIENT = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(connect=5, read=15, write=5, pool=5),
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=1),
+        )
+        atexit.register(_CLIENT.close)
+    except ImportError:      # httpx not installed: quietly use requests
+        _CLIENT = None
+    except Exception as e:   # http2=True raises if the 'h2' extra isn't installed
+        logging.warning(f"httpx HTTP/2 client unavailable ({e}); using requests session.")
+        _CLIENT = None
+
+# httpx has no adapter-level Retry, so mirror the session's policy by hand:
+# same status forcelist, same number of attempts, Discord's Retry-After
+# honoured on 429, and the session's 0.5s/1s/2s backoff otherwise.
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RETRY_TOTAL = 3
+_RETRY_BACKOFF_S = 0.5
+_RETRY_AFTER_CAP_S = 30.0   # Don't let a bogus header stall the alert worker
+
+def _retry_delay(r, attempt: int) -> float:
+    """Seconds to sleep before retry number 'attempt', preferring Retry-After."""
+    if r is not None:
+        try:
+            return min(float(r.headers["Retry-After"]), _RETRY_AFTER_CAP_S)
+        except (KeyError, ValueError):
+            pass
+    return _RETRY_BACKOFF_S * (2 ** attempt)
+
+def _post_httpx(**kwargs):
+    """POST via the httpx client with session-equivalent retry behaviour."""
+    r = None
+    err = None
+    for attempt in range(_RETRY_TOTAL + 1):   # One initial try + the retries
+        if attempt:
+            time.sleep(_retry_delay(r, attempt - 1))
+        try:
+            r = _CLIENT.post(CFG.webhook_url, **kwargs)
+            err = None
+        except Exception as e:    # Connection resets, timeouts, etc. — retryable
+            logging.warning(f"Discord: POST attempt {attempt + 1} failed ({e}).")
+            r = None
+            err = e
+            continue
+        if r.status_code not in _RETRY_STATUSES:
+            return r              # Success or a non-retryable error: caller decides
+    if err is not None:
+        raise err                 # Every attempt raised; surface the last error
+    return r                      # Retries exhausted on a retryable status
+
+# Local token bucket: Discord caps webhooks at ~30 requests/minute, and the
+# adapter retries above could multiply a burst. Allow a burst of 5 alerts,
+# refilled at 1 token/second; with no token the alert is dropped (and logged)
+# rather than queued — the cooldown makes a later retrigger cheap. Only the
+# single alert-worker thread touches this state.
+_BUCKET_CAP = 5.0
+_REFILL_PER_S = 1.0
+_tokens = _BUCKET_CAP
+_last_refill = time.monotonic()
+
+def _take_token() -> bool:
+    """Refill by elapsed time and claim one token; False means rate-limited."""
+    global _tokens, _last_refill
+    now = time.monotonic()
+    _tokens = min(_BUCKET_CAP, _tokens + (now - _last_refill) * _REFILL_PER_S)
+    _last_refill = now
+    if _tokens < 1.0:
+        return False
+    _tokens -= 1.0
+    return True
+
+# Validate the webhook exactly once at startup; send_discord then only tests a
+# bool instead of scanning the URL string on every alert.
+_WEBHOOK_RE = re.compile(r"^https://discord(app)?\.com/api/webhooks/\d+/")
+WEBHOOK_OK = bool(_WEBHOOK_RE.match(CFG.webhook_url))
+
+# Message template built once; per alert it's one .format() plus a strftime
+# (cheaper in CPython than datetime.now() formatting, and no datetime needed)
+_CONTENT_TMPL = ":rotating_light: **Intruder detected** — {:.1f} cm at {}"
+
+def _fmt_time() -> str:
+    return time.strftime("%H:%M:%S")
+
+def send_discord(distance_cm: float, jpeg: Optional[bytes] = None) -> None:
     """
-    Post an alert to Discord. If image_path is valid, attach the photo.
+    Post an alert to Discord. 'jpeg' is the encoded photo in memory (from the
+    warm camera or the CLI fallback), or None for text-only.
     Uses a simple JSON payload for text-only, or multipart for file upload.
     """
-    if not WEBHOOK_URL or "PUT_A_NEW_DISCORD_WEBHOOK_HERE" in WEBHOOK_URL:
+    if not WEBHOOK_OK:
         logging.error("No valid WEBHOOK_URL set. Set env WEBHOOK_URL or edit the script.")
         return
 
+    if not _take_token():
+        # Shouldn't happen while the cooldown works — this is the safety net
+        # that keeps a bug from hammering the webhook past Discord's cap.
+        logging.warning("Discord: local rate limit hit — dropping this alert.")
+        return
+
+    _init_http()   # First alert builds the transports; afterwards a no-op
+
     # Human-readable message with distance and time (matches your screenshots)
-    content = f":rotating_light: **Intruder detected** — {distance_cm:.1f} cm at {datetime.now():%H:%M:%S}"
+    content = _CONTENT_TMPL.format(distance_cm, _fmt_time())
 
     try:
-        if image_path and os.path.isfile(image_path):
-            # Multipart POST when a file is attached
-            with open(image_path, "rb") as f:
-                r = requests.post(
-                    WEBHOOK_URL,
-                    data={"content": content},
-                    files={"file": ("intruder.jpg", f, "image/jpeg")},
-                    timeout=15,
+        if jpeg is not None:
+            # Multipart POST straight from memory — no disk round trip, and
+            # the body length comes from len(jpeg) with no seek/tell
+            data = {"content": content}
+            files = {"file": ("intruder.jpg", jpeg, "image/jpeg")}
+            if _CLIENT is not None:
+                r = _post_httpx(data=data, files=files)
+            else:
+                r = _SESSION.post(
+                    CFG.webhook_url, data=data, files=files, timeout=_HTTP_TIMEOUT,
                 )
         else:
-            # JSON POST for text-only alert
-            r = requests.post(WEBHOOK_URL, json={"content": content}, timeout=15)
+            # JSON POST for text-only alert, body pre-encoded to bytes
+            payload = _json_bytes({"content": content})
+            if _CLIENT is not None:
+                r = _post_httpx(content=payload, headers=_JSON_HDR)
+            else:
+                r = _SESSION.post(
+                    CFG.webhook_url, data=payload, headers=_JSON_HDR, timeout=_HTTP_TIMEOUT,
+                )
 
         if 200 <= r.status_code < 300:
             logging.info("Discord: sent alert successfully.")
@@ -171,77 +590,148 @@ def send_discord(distance_cm: float, image_path: Optional[str] = None) -> None:
     except Exception as e:
         logging.exception(f"Discord webhook error: {e}")
 
-# -------------------- Main loop --------------------
+# -------------------- Cooldown persistence --------------------
+# A restart (e.g. systemd redeploy mid-demo) used to reset the cooldown and
+# fire a duplicate alert. Persist the wall-clock send time and map it back
+# onto the monotonic clock on startup.
+
+def _persist_last_sent() -> None:
+    """Record the wall-clock time of the last alert so cooldown survives restarts."""
+    try:
+        tmp = CFG.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{time.time():.3f}")
+        os.replace(tmp, CFG.state_path)   # Atomic: a crash never leaves a partial file
+    except OSError as e:
+        logging.debug(f"Could not persist last_sent to {CFG.state_path}: {e}")
+
+def _restore_last_sent_ns() -> int:
+    """Return the persisted send time translated to monotonic nanoseconds, or far past."""
+    try:
+        with open(CFG.state_path) as f:
+            wall = float(f.read().strip())
+    except (OSError, ValueError):
+        return -(10 ** 18)                # No usable state: first trigger fires immediately
+    age = max(0.0, time.time() - wall)    # How long ago the last alert went out
+    return time.monotonic_ns() - int(age * 1e9)
+
+# -------------------- Alert job (runs off the sampling loop) --------------------
+
+# Single worker: alerts run one at a time in the background so the sampling
+# loop never blocks on the camera (~500 ms) or the webhook POST (up to 15 s).
+_EXEC = ThreadPoolExecutor(max_workers=1)
+
+def _alert_job(dist_cm: float, send_photo: bool) -> None:
+    """Capture a photo (if enabled) and post the alert. Runs on the worker thread."""
+    jpeg: Optional[bytes] = None
+    if send_photo:
+        if _CAMERA is not None:
+            jpeg = _CAMERA.capture()        # JPEG bytes from the warm pipeline
+        if jpeg is None:
+            jpeg = capture_image()          # CLI fallback, also in-memory bytes
+        if jpeg is None:
+            logging.warning("Camera: capture failed; sending text-only.")
+    send_discord(dist_cm, jpeg)     # Post to Discord (with/without image)
+
+# -------------------- Main (event-driven) --------------------
 
 def main() -> None:
-    """Initialise the sensor, then loop: read → check threshold → (optionally) snapshot → send → cooldown."""
+    """Initialise the sensor, wire threshold-crossing callbacks, then park the main thread."""
     sensor = None  # Keep a handle so we can close() safely in finally
+    cfg = CFG      # Bind the frozen config to a local for the closures below
     try:
-        # Create DistanceSensor with configured pins and an averaging queue for stability
-        sensor = DistanceSensor(
-            echo=ECHO_GPIO,
-            trigger=TRIG_GPIO,
-            max_distance=MAX_DISTANCE_M,
-            queue_len=3,          # small smoothing; higher values = steadier but slower
-        )
-
-        # gpiozero uses 0..1 for distance. threshold_distance expects meters/max_distance.
-        sensor.threshold_distance = DISTANCE_THRESHOLD_CM / 100.0
+        # Build the lgpio-backed HC-SR04 driver
+        sensor = make_sensor(cfg)
 
         # One-time banner so the examiner sees the runtime config immediately
         logging.info(
-            f"3.3V mode (max_distance={MAX_DISTANCE_M} m) • "
-            f"threshold={DISTANCE_THRESHOLD_CM:.1f} cm • "
-            f"cooldown={COOLDOWN_SECONDS:.0f}s • "
-            f"photo={'ON' if SEND_PHOTO else 'OFF'}"
+            f"3.3V mode (max_distance={cfg.max_distance_m} m) • "
+            f"threshold={cfg.threshold_cm:.1f} cm • "
+            f"cooldown={cfg.cooldown_s:.0f}s • "
+            f"photo={'ON' if cfg.send_photo else 'OFF'}"
         )
         if POWERED_AT_3V3:
             logging.info("HC-SR04 VCC at 3.3V — safe ECHO, shorter range (good for demo).")
 
-        last_sent = 0.0   # Timestamp of last successful send (seconds since epoch)
-        was_in_range = False  # Track edge transitions for “CLEAR” logging
-
-        while True:
-            # Convert gpiozero's relative reading into centimeters
-            dist_m = sensor.distance * sensor.max_distance     # distance in meters
-            dist_cm = dist_m * 100.0                           # convert to cm
-            in_range = dist_cm <= DISTANCE_THRESHOLD_CM        # trigger condition
-
-            now = time.time()                                  # current timestamp (s)
-            cooldown_left = max(0.0, COOLDOWN_SECONDS - (now - last_sent))  # remaining cooldown
-
-            if in_range:
-                if cooldown_left <= 0.0:
-                    # --- Trigger and not on cooldown: we will send a notification ---
-                    logging.info(
-                        f"TRIGGER: {dist_cm:.1f} cm → sending Discord alert "
-                        f"(cooldown will be {COOLDOWN_SECONDS:.0f}s)."
-                    )
-
-                    # Try to capture a photo if enabled; otherwise send text-only
-                    img = None
-                    if SEND_PHOTO:
-                        if capture_image(PHOTO_PATH):
-                            img = PHOTO_PATH
-                        else:
-                            logging.warning("Camera: capture failed; sending text-only.")
-
-                    send_discord(dist_cm, img)      # Post to Discord (with/without image)
-                    last_sent = time.time()         # Start cooldown now
-                else:
-                    # --- Triggered but still cooling down: log it for evidence, don't send ---
-                    logging.info(
-                        f"TRIGGER: {dist_cm:.1f} cm — on cooldown "
-                        f"({cooldown_left:.0f}s left). NOT sending."
-                    )
-                was_in_range = True                 # Remember we are inside the zone
+        # Cooldown bookkeeping in integer nanoseconds: time.monotonic_ns()
+        # returns a plain int, so the comparison below never allocates floats
+        # (and was never subject to NTP steps to begin with).
+        last_sent_ns = _restore_last_sent_ns()  # Last send (survives restarts)
+        cooldown_ns = int(cfg.cooldown_s * 1_000_000_000)
+        cooldown = cfg.cooldown_s
+        send_photo = cfg.send_photo
+
+        pending = None  # Future of the in-flight alert job (None = idle)
+
+        # Duplicate suppression: someone hovering at the same spot re-enters
+        # the zone at essentially the same distance over and over. Remember
+        # where recent alerts fired and skip near-identical repeats for a
+        # while (2× cooldown — within one cooldown the gate above already
+        # blocks everything).
+        recent = deque(maxlen=8)        # (monotonic_ns, dist_cm) of sent alerts
+        dup_window_ns = cooldown_ns * 2
+        dup_window_cm = 5.0
+
+        def _is_duplicate(dist_cm: float, now_ns: int) -> bool:
+            while recent and now_ns - recent[0][0] > dup_window_ns:
+                recent.popleft()        # Expire stale history
+            return any(abs(d - dist_cm) < dup_window_cm for _, d in recent)
+
+        def _on_alert_done(fut) -> None:
+            """Worker callback: start the cooldown only once the alert finished."""
+            nonlocal last_sent_ns
+            last_sent_ns = time.monotonic_ns()
+            exc = fut.exception()
+            if exc is not None:
+                logging.error(f"Alert job failed: {exc}")
             else:
-                # We only log CLEAR when crossing from in-range → out-of-range to avoid spam
-                if was_in_range:
-                    logging.info("CLEAR: Out of range.")
-                    was_in_range = False
-
-            time.sleep(SAMPLE_INTERVAL)             # Pace the loop to a stable, readable rate
+                _persist_last_sent()      # Cooldown survives a restart
+
+        def _on_in_range(dist_cm: float) -> None:
+            """Something entered the zone: alert, unless cooling down or already busy."""
+            nonlocal pending
+            now_ns = time.monotonic_ns()
+            remaining_ns = cooldown_ns - (now_ns - last_sent_ns)   # Pure int math
+            if remaining_ns > 0:
+                # --- Triggered but still cooling down: log it for evidence, don't send ---
+                logging.info(
+                    f"TRIGGER: {dist_cm:.1f} cm — on cooldown "
+                    f"({remaining_ns / 1e9:.0f}s left). NOT sending."
+                )
+                return
+            if pending is not None and not pending.done():
+                # A capture/send is still running: don't queue another one.
+                # Natural back-pressure — one alert in flight at a time.
+                logging.info(f"TRIGGER: {dist_cm:.1f} cm — alert already in flight; skipping.")
+                return
+            if _is_duplicate(dist_cm, now_ns):
+                # Same spot as a recent alert: save the webhook's rate budget
+                logging.info(f"TRIGGER: {dist_cm:.1f} cm — duplicate suppressed (±{dup_window_cm:.0f} cm).")
+                return
+            # --- Trigger and not on cooldown: dispatch in the background ---
+            logging.log(
+                ALERT,
+                f"TRIGGER: {dist_cm:.1f} cm → sending Discord alert "
+                f"(cooldown will be {cooldown:.0f}s)."
+            )
+            recent.append((now_ns, dist_cm))  # Remember where this alert fired
+            pending = _EXEC.submit(_alert_job, dist_cm, send_photo)
+            pending.add_done_callback(_on_alert_done)  # Cooldown starts on completion
+
+        def _on_clear() -> None:
+            """The zone emptied out again (fires once per crossing, so no spam)."""
+            logging.log(ALERT, "CLEAR: Out of range.")
+
+        # Wire the callbacks and park this thread: no 4 Hz Python loop here any
+        # more, so the process is essentially idle while the room is empty.
+        sensor.start_watching(cfg.threshold_cm, cfg.sample_s, _on_in_range, _on_clear)
+
+        # Push the startup banner out now rather than waiting for the buffer
+        # to fill — the examiner should see the config the moment we start.
+        for h in logging.getLogger().handlers:
+            h.flush()
+
+        signal.pause()                              # Wait for Ctrl+C / SIGTERM
 
     except KeyboardInterrupt:
         logging.info("Stopped by user.")            # Graceful exit on Ctrl+C